@@ -1,15 +1,21 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
 
 from flask import Flask, render_template, g, session, request, jsonify, flash, redirect
 
 from flask_debugtoolbar import DebugToolbarExtension
 from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
-import requests
 
+from cache import TTLCache, SingleFlight
 from forms import UserAddForm, LoginForm, CourseAddForm, CourseSearchForm
 
-from models import db, connect_db, User, Course, Video, VideoCourse
+from models import db, connect_db, User, Course, Video, VideoCourse, SearchCache, QuotaUsage, RateLimit
+from youtube import (YouTubeClient, YouTubeAPIError, CircuitBreaker, QuotaBudget, QuotaExceededError,
+                     VideoResult, parse_duration)
 
 # comment this line out when deploying to Heroku
 # from secrets import API_SECRET_KEY
@@ -18,7 +24,13 @@ from models import db, connect_db, User, Course, Video, VideoCourse
 API_SECRET_KEY = os.environ.get('API_SECRET_KEY')
 
 CURR_USER_KEY = "curr_user"
-API_BASE_URL = "https://www.googleapis.com/youtube/v3"
+# point this at youtube_stub.py to run without the real YouTube Data API
+API_BASE_URL = os.environ.get('API_BASE_URL', "https://www.googleapis.com/youtube/v3")
+# ask YouTube for only the parts of each search result that we use
+SEARCH_FIELDS = "nextPageToken,items(id/videoId,snippet(title,channelId,channelTitle,description,thumbnails/high/url))"
+# ...and of each video's details
+VIDEO_DETAILS_PARTS = "player,contentDetails,statistics"
+VIDEO_DETAILS_FIELDS = "items(id,player/embedHtml,contentDetails/duration,statistics/viewCount)"
 
 app = Flask(__name__)
 
@@ -31,11 +43,56 @@ app.config['SQLALCHEMY_ECHO'] = False
 # redirects must be intercepted for some tests to pass
 app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', "another543256432secret")
+# YouTube keyword search results are cached per worker (ttl in seconds)
+app.config['YT_SEARCH_CACHE_TTL'] = int(os.environ.get('YT_SEARCH_CACHE_TTL', 3600))
+app.config['YT_SEARCH_CACHE_SIZE'] = int(os.environ.get('YT_SEARCH_CACHE_SIZE', 512))
+# ...and for longer in the database, where all workers share them
+app.config['YT_SEARCH_DB_CACHE_TTL'] = int(os.environ.get('YT_SEARCH_DB_CACHE_TTL', 86400))
+# timeouts (in seconds) and retries for calls to the YouTube Data API
+app.config['YT_CONNECT_TIMEOUT'] = float(os.environ.get('YT_CONNECT_TIMEOUT', 3.05))
+app.config['YT_READ_TIMEOUT'] = float(os.environ.get('YT_READ_TIMEOUT', 5))
+app.config['YT_MAX_RETRIES'] = int(os.environ.get('YT_MAX_RETRIES', 2))
+# stop calling YouTube for YT_BREAKER_RESET seconds after YT_BREAKER_FAILURES
+# consecutive failed calls (or calls slower than YT_LATENCY_SLO seconds)
+app.config['YT_BREAKER_FAILURES'] = int(os.environ.get('YT_BREAKER_FAILURES', 5))
+app.config['YT_BREAKER_RESET'] = float(os.environ.get('YT_BREAKER_RESET', 30))
+app.config['YT_LATENCY_SLO'] = float(os.environ.get('YT_LATENCY_SLO', 2))
+# daily YouTube quota; searches stop (cache-only mode) when only the reserve is left
+app.config['YT_QUOTA_DAILY'] = int(os.environ.get('YT_QUOTA_DAILY', 10000))
+app.config['YT_QUOTA_RESERVE'] = int(os.environ.get('YT_QUOTA_RESERVE', 500))
+# each user may make SEARCH_RATE_BURST video searches at once, refilled at
+# SEARCH_RATE_PER_MINUTE searches per minute
+app.config['SEARCH_RATE_PER_MINUTE'] = float(os.environ.get('SEARCH_RATE_PER_MINUTE', 10))
+app.config['SEARCH_RATE_BURST'] = int(os.environ.get('SEARCH_RATE_BURST', 10))
+# most concurrent calls per worker when fetching video details from YouTube
+app.config['YT_HYDRATE_WORKERS'] = int(os.environ.get('YT_HYDRATE_WORKERS', 4))
 
 toolbar = DebugToolbarExtension(app)
 
 connect_db(app)
 
+search_cache = TTLCache(maxsize=app.config['YT_SEARCH_CACHE_SIZE'],
+                        ttl=app.config['YT_SEARCH_CACHE_TTL'])
+# concurrent identical searches share a single call to YouTube
+search_flight = SingleFlight()
+
+# all outbound YouTube traffic goes through this client (one per worker)
+yt_client = YouTubeClient(API_BASE_URL, API_SECRET_KEY,
+                          connect_timeout=app.config['YT_CONNECT_TIMEOUT'],
+                          read_timeout=app.config['YT_READ_TIMEOUT'],
+                          max_retries=app.config['YT_MAX_RETRIES'],
+                          breaker=CircuitBreaker(
+                              failure_threshold=app.config['YT_BREAKER_FAILURES'],
+                              reset_timeout=app.config['YT_BREAKER_RESET'],
+                              latency_slo=app.config['YT_LATENCY_SLO']),
+                          quota=QuotaBudget(QuotaUsage,
+                                            daily_limit=app.config['YT_QUOTA_DAILY'],
+                                            reserve=app.config['YT_QUOTA_RESERVE']))
+
+# bounds the concurrent video details calls made by hydrate_videos
+hydrate_pool = ThreadPoolExecutor(max_workers=app.config['YT_HYDRATE_WORKERS'],
+                                  thread_name_prefix="yt-hydrate")
+
 
 @app.before_request
 def add_user_to_g():
@@ -54,7 +111,9 @@ def add_user_to_g():
 def search_videos():
     """API endpoint.
     This route has no view.
-    Get videos from YouTube based on topic entered in search field."""
+    Get videos from YouTube based on topic entered in search field.
+    Pass the pageToken from a response's X-Next-Page-Token header to get the
+    next page of results."""
 
     if not g.user:
         flash("Access unauthorized.", "danger")
@@ -63,6 +122,7 @@ def search_videos():
     # get search form data
     data = get_form_data()
     keyword = data["keyword"]
+    page_token = data["pageToken"]
 
     # validate the form data
     errors = validate_data(data)
@@ -71,12 +131,35 @@ def search_videos():
     if errors['errors']:
         return errors
 
+    # limit how often each user can search
+    if not RateLimit.consume(g.user.id,
+                             rate=app.config['SEARCH_RATE_PER_MINUTE'] / 60,
+                             capacity=app.config['SEARCH_RATE_BURST']):
+        errors['errors']['keyword'] = ["You are searching too quickly. Please wait a moment and try again."]
+        return jsonify(errors), 429, {"Retry-After": str(int(60 / app.config['SEARCH_RATE_PER_MINUTE']) + 1)}
+
     # no errors in data; get videos for the keyword searched
-    res = get_yt_videos(keyword)
+    res = get_yt_videos(keyword, page_token)
 
     return res
 
 
+@app.route("/api/stats", methods=["GET"])
+def api_stats():
+    """API endpoint.
+    This route has no view.
+    Report cache, YouTube client and circuit breaker counters for this worker,
+    and the YouTube quota used today by all workers."""
+
+    if not g.user:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    return jsonify({"searchCache": search_cache.stats(),
+                    "searchFlight": search_flight.stats(),
+                    "youtube": yt_client.stats()})
+
+
 # *******************************
 # USER ROUTES
 # *******************************
@@ -249,6 +332,9 @@ def add_video_to_course(course_id, yt_video_id):
     db.session.add(video_course)
     db.session.commit()
 
+    if video.hydrated_at is None:
+        hydrate_in_background([video.yt_video_id])
+
     flash("Good news! The video was successfully added to the course.", "success")
 
     return redirect(f'../../../../courses/{course_id}/videos/search')
@@ -509,6 +595,7 @@ def get_form_data():
     # get search form data from app.js
     data = {}
     data["keyword"] = request.json['keyword']
+    data["pageToken"] = request.json.get('pageToken') or ""
 
     return data
 
@@ -526,72 +613,274 @@ def validate_data(data):
     return errors
 
 
-def get_yt_videos(keyword):
-    """Get videos from YouTube API on a given topic."""
+def normalize_keyword(keyword):
+    """Fold case and whitespace so equivalent searches share a cache entry."""
+
+    return " ".join(keyword.split()).casefold()
+
+
+def get_yt_videos(keyword, page_token=""):
+    """Get a page of videos from YouTube API on a given topic.
+    Results are served from the search cache (each page cached separately)
+    when possible.
+    If YouTube is unavailable, serve the last known results for the
+    keyword (flagged as stale) and try to refresh them in the background."""
 
     MAX_RESULTS = 20
 
-    # search for video data
-    search_json = yt_search(keyword, MAX_RESULTS)
+    keyword = normalize_keyword(keyword)
+    cache_key = (keyword, MAX_RESULTS, page_token)
+
+    page = search_cache.get(cache_key)
+    cache_status = "HIT"
+
+    if page is None:
+        try:
+            # only one of any concurrent identical searches goes to YouTube
+            page = search_flight.do(cache_key, fetch_yt_videos, *cache_key)
+            cache_status = "MISS"
+
+        except YouTubeAPIError as e:
+            app.logger.warning("YouTube search for %r failed: %s", keyword, e)
 
-    items = search_json["items"]
+            page = get_stale_yt_videos(*cache_key)
 
-    # create list of dicts containing info & data re: individual videos
-    videos_data = create_list_of_videos(items)
+            if page is None:
+                if isinstance(e, QuotaExceededError):
+                    message = "The daily limit for video searches has been reached. Please try again tomorrow."
+                else:
+                    message = "Video search is unavailable right now. Please try again in a few minutes."
+                return jsonify({'errors': {'keyword': [message]}}), 503
 
-    res_json = jsonify(videos_data)
+            cache_status = "STALE"
+            refresh_in_background(*cache_key)
+
+    videos_json, next_page_token = page
+
+    # results are cached already serialized, so send them as they are
+    res_json = app.response_class(videos_json, mimetype="application/json")
+    res_json.headers["X-Cache"] = cache_status
+
+    if next_page_token:
+        res_json.headers["X-Next-Page-Token"] = next_page_token
+
+    if cache_status == "STALE":
+        res_json.headers["Warning"] = '110 - "Response is Stale"'
 
     return res_json
 
 
-def yt_search(keyword, max_results):
+def fetch_yt_videos(keyword, max_results, page_token):
+    """Get a page of search results for a (normalized) keyword from the
+    database cache or, failing that, from YouTube.
+    Cache the page in this worker.
+    Return (results serialized as JSON, token for the next page)."""
+
+    page = SearchCache.lookup(keyword, max_results, page_token,
+                              app.config['YT_SEARCH_DB_CACHE_TTL'])
+
+    if page is None:
+        # search for video data
+        search_json = yt_search(keyword, max_results, page_token)
+
+        items = search_json.get("items", [])
+
+        # create list of records containing info & data re: individual videos
+        videos_data = create_list_of_videos(items)
+
+        page = (orjson.dumps(videos_data), search_json.get("nextPageToken"))
+
+        SearchCache.store(keyword, max_results, page_token, *page)
+
+    search_cache.set((keyword, max_results, page_token), page)
+
+    return page
+
+
+def get_stale_yt_videos(keyword, max_results, page_token):
+    """Get the last known page of search results for a keyword, however old.
+    Return None if the page has never been fetched."""
+
+    page = search_cache.get_stale((keyword, max_results, page_token))
+
+    if page is None:
+        page = SearchCache.lookup(keyword, max_results, page_token)
+
+    return page
+
+
+def refresh_in_background(keyword, max_results, page_token):
+    """Try to refresh a cached page of results for a keyword without making the
+    current request wait.
+    Skipped while the circuit breaker is refusing calls."""
+
+    if yt_client.breaker.state == CircuitBreaker.OPEN:
+        return
+
+    def refresh():
+        with app.app_context():
+            try:
+                search_flight.do((keyword, max_results, page_token), fetch_yt_videos,
+                                 keyword, max_results, page_token)
+            except YouTubeAPIError as e:
+                app.logger.info("Background refresh of %r failed: %s", keyword, e)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def yt_search(keyword, max_results, page_token=""):
     """Retrieve videos by keyword.
     Limit results to number in max_results.
+    Start from the page given by page_token, if any.
     Return JSON response."""
 
-    # search for video data
-    res = requests.get(
-        f"{API_BASE_URL}/search/?part=snippet&maxResults={max_results}&type=video&q={keyword}&order=relevance&key={API_SECRET_KEY}"
-    )
+    params = {"fields": SEARCH_FIELDS}
+    if page_token:
+        params["pageToken"] = page_token
 
-    # turn search results into json
-    res_json = res.json()
+    # search for video data
+    res_json = yt_client.search(keyword, max_results, **params)
 
     return res_json
 
 
-# create list of dicts containing info & data re: individual videos
+# create list of records containing info & data re: individual videos
 def create_list_of_videos(items):
 
     videos_data = []
 
     for video in items:
+        snippet = video['snippet']
 
-        video_data = {}
-        # add video data to video_data dict
-        video_data["ytVideoId"] = video['id']['videoId']
-        video_data["title"] = video['snippet']['title']
-        video_data["channelId"] = video['snippet']['channelId']
-        video_data["channelTitle"] = video['snippet']['channelTitle']
-        video_data["description"] = video['snippet']['description']
-        video_data["thumb_url_medium"] = video['snippet']['thumbnails']['high']['url']
-
-        videos_data.append(video_data)
+        videos_data.append(VideoResult(
+            ytVideoId=video['id']['videoId'],
+            title=snippet['title'],
+            channelId=snippet['channelId'],
+            channelTitle=snippet['channelTitle'],
+            description=snippet['description'],
+            thumb_url_medium=snippet['thumbnails']['high']['url'],
+        ))
 
     return videos_data
 
 
-def yt_videos(yt_video_id):
-    """Make API call to YouTube Data API.
+def yt_videos(yt_video_ids):
+    """Make API call to YouTube Data API for the details of up to 50 videos.
     Return the result in JSON format."""
 
-    res = requests.get(
-        f"{API_BASE_URL}/videos?part=player&id={yt_video_id}&key={API_SECRET_KEY}"
-    )
-    videos_json = res.json()
+    videos_json = yt_client.videos(yt_video_ids,
+                                   part=VIDEO_DETAILS_PARTS,
+                                   fields=VIDEO_DETAILS_FIELDS,
+                                   maxResults=YouTubeClient.MAX_IDS_PER_CALL)
 
     return videos_json
 
+
+## ************************************************
+## HELPER FUNCTIONS - video details from YouTube
+## ************************************************
+
+def hydrate_videos(yt_video_ids):
+    """Get player, duration and statistics for any number of videos.
+    Ids are sent to YouTube in batches of up to 50, with the batches fetched
+    concurrently (at most YT_HYDRATE_WORKERS at a time).
+    Return a dict of video details keyed by YouTube video id; ids YouTube
+    does not know, or whose batch failed, are left out."""
+
+    yt_video_ids = list(dict.fromkeys(yt_video_ids))
+    size = YouTubeClient.MAX_IDS_PER_CALL
+    batches = [yt_video_ids[i:i + size] for i in range(0, len(yt_video_ids), size)]
+
+    futures = [hydrate_pool.submit(run_in_app_context, yt_videos, batch) for batch in batches]
+
+    details = {}
+
+    for batch, future in zip(batches, futures):
+        try:
+            videos_json = future.result()
+        except YouTubeAPIError as e:
+            app.logger.warning("Getting details for %d videos failed: %s", len(batch), e)
+            continue
+
+        for item in videos_json.get("items", []):
+            details[item["id"]] = item
+
+    return details
+
+
+def run_in_app_context(fn, *args):
+    """Call fn in an application context (for use from worker threads)."""
+
+    with app.app_context():
+        return fn(*args)
+
+
+def save_video_details(details):
+    """Store video details from hydrate_videos on the matching videos,
+    in a single statement.
+    Return the number of videos updated."""
+
+    if not details:
+        return 0
+
+    rows = [{
+        "b_yt_video_id": yt_video_id,
+        "b_embed_html": item.get("player", {}).get("embedHtml"),
+        "b_duration": parse_duration(item.get("contentDetails", {}).get("duration")),
+        "b_view_count": to_int(item.get("statistics", {}).get("viewCount")),
+    } for yt_video_id, item in details.items()]
+
+    stmt = (Video.__table__.update()
+            .where(Video.yt_video_id == db.bindparam("b_yt_video_id"))
+            .values(embed_html=db.bindparam("b_embed_html"),
+                    duration=db.bindparam("b_duration"),
+                    view_count=db.bindparam("b_view_count"),
+                    hydrated_at=db.func.now()))
+
+    result = db.session.execute(stmt, rows)
+    db.session.commit()
+
+    return result.rowcount
+
+
+def to_int(value):
+    """YouTube sends counts as strings; return value as an int, or None."""
+
+    return int(value) if value is not None else None
+
+
+def hydrate_and_save(yt_video_ids):
+    """Fetch details for the given videos from YouTube and store them.
+    Return the number of videos updated."""
+
+    return save_video_details(hydrate_videos(yt_video_ids))
+
+
+def hydrate_in_background(yt_video_ids):
+    """Fetch and store details for the given videos without making the
+    current request wait.
+    Skipped while the circuit breaker is refusing calls; the videos stay
+    unhydrated until `flask hydrate-videos` picks them up."""
+
+    if yt_client.breaker.state == CircuitBreaker.OPEN:
+        return
+
+    # not run on hydrate_pool itself: hydrate_videos waits on that pool
+    threading.Thread(target=run_in_app_context, args=(hydrate_and_save, yt_video_ids),
+                     daemon=True).start()
+
+
+@app.template_filter("duration")
+def format_duration(seconds):
+    """Format a video length in seconds like YouTube does, e.g. 1:02:03 or 4:05."""
+
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
 ## *********************************
 ## HELPER FUNCTION(S): video route(s)
 ## *********************************
@@ -718,4 +1007,50 @@ def populate_demo_data():
                                video_id=video3_db.id,
                                video_seq=video3_seq)
     db.session.add(video_course3)
-    db.session.commit()
\ No newline at end of file
+    db.session.commit()
+
+
+# *******************************
+# CLI COMMANDS
+# *******************************
+
+@app.cli.command("purge-search-cache")
+def purge_search_cache():
+    """Delete expired YouTube search results from the database.
+    Run this periodically, e.g. from a scheduler:
+
+        flask purge-search-cache
+    """
+
+    deleted = SearchCache.purge_stale(app.config['YT_SEARCH_DB_CACHE_TTL'])
+    print(f"Deleted {deleted} expired search cache entries.")
+
+
+@app.cli.command("hydrate-videos")
+def hydrate_all_videos():
+    """Fetch player, duration and statistics from YouTube for every video that
+    does not have them yet (e.g. added while YouTube was unavailable):
+
+        flask hydrate-videos
+    """
+
+    BATCH_SIZE = 500
+
+    updated = 0
+    # ids YouTube returned nothing for are skipped rather than retried forever
+    last_id = 0
+
+    while True:
+        videos = (db.session.query(Video.id, Video.yt_video_id)
+                  .filter(Video.hydrated_at.is_(None), Video.id > last_id)
+                  .order_by(Video.id)
+                  .limit(BATCH_SIZE)
+                  .all())
+
+        if not videos:
+            break
+
+        last_id = videos[-1].id
+        updated += hydrate_and_save([v.yt_video_id for v in videos])
+
+    print(f"Stored details for {updated} videos.")
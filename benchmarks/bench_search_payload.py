@@ -0,0 +1,129 @@
+"""Micro-benchmark: YouTube search payload size and parse/serialize time.
+
+Compares the full `part=snippet` search response with the `fields`-projected
+one that yt_search asks for, and jsonify of dicts with orjson of records.
+Payloads are synthetic but shaped like real YouTube search responses.
+
+run it like:
+
+    python benchmarks/bench_search_payload.py
+"""
+
+import json
+import os
+import sys
+import timeit
+
+import orjson
+from flask import jsonify
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import app, create_list_of_videos  # noqa: E402
+
+REPEAT = 2000
+
+
+def thumbnail(video_id, name, width, height):
+    return {"url": f"https://i.ytimg.com/vi/{video_id}/{name}.jpg", "width": width, "height": height}
+
+
+def full_item(i):
+    """A search result as returned for part=snippet with no fields filter."""
+
+    video_id = f"vid{i:08d}"
+    return {
+        "kind": "youtube#searchResult",
+        "etag": "Zy1JqKJf3h4NvZzN6D0sPMYXe8Y",
+        "id": {"kind": "youtube#video", "videoId": video_id},
+        "snippet": {
+            "publishedAt": "2020-11-04T16:00:12Z",
+            "channelId": "UCij4PbZVBmFbUYieXQmt6lQ",
+            "title": f"PMP Exam Questions And Answers - PMP Certification - Video {i}",
+            "description": "Lot of people think that solving thousands of PMP exam questions and "
+                           "answers will be the deal breaker in there PMP exam prep program. I am not 100% ...",
+            "thumbnails": {
+                "default": thumbnail(video_id, "default", 120, 90),
+                "medium": thumbnail(video_id, "mqdefault", 320, 180),
+                "high": thumbnail(video_id, "hqdefault", 480, 360),
+            },
+            "channelTitle": "EduHubSpot",
+            "liveBroadcastContent": "none",
+            "publishTime": "2020-11-04T16:00:12Z",
+        },
+    }
+
+
+def projected_item(item):
+    """The same search result with the fields filter yt_search sends."""
+
+    snippet = item["snippet"]
+    return {
+        "id": {"videoId": item["id"]["videoId"]},
+        "snippet": {
+            "title": snippet["title"],
+            "channelId": snippet["channelId"],
+            "channelTitle": snippet["channelTitle"],
+            "description": snippet["description"],
+            "thumbnails": {"high": {"url": snippet["thumbnails"]["high"]["url"]}},
+        },
+    }
+
+
+def search_response(items, full):
+    res = {"items": items}
+    if full:
+        res.update({
+            "kind": "youtube#searchListResponse",
+            "etag": "x7SFuAJg2x5ptl3dJI9DkO5D6xk",
+            "nextPageToken": "CBQQAA",
+            "regionCode": "US",
+            "pageInfo": {"totalResults": 1000000, "resultsPerPage": len(items)},
+        })
+    return res
+
+
+def per_call(stmt):
+    """Return the mean time of `stmt` in microseconds."""
+
+    return timeit.timeit(stmt, number=REPEAT) / REPEAT * 1e6
+
+
+def old_create_list_of_videos(items):
+    """create_list_of_videos as it was before records were introduced."""
+
+    videos_data = []
+    for video in items:
+        video_data = {}
+        video_data["ytVideoId"] = video['id']['videoId']
+        video_data["title"] = video['snippet']['title']
+        video_data["channelId"] = video['snippet']['channelId']
+        video_data["channelTitle"] = video['snippet']['channelTitle']
+        video_data["description"] = video['snippet']['description']
+        video_data["thumb_url_medium"] = video['snippet']['thumbnails']['high']['url']
+        videos_data.append(video_data)
+    return videos_data
+
+
+def bench(n):
+    items = [full_item(i) for i in range(n)]
+    full_body = json.dumps(search_response(items, full=True)).encode()
+    projected_body = json.dumps(search_response([projected_item(i) for i in items], full=False)).encode()
+
+    old_videos = old_create_list_of_videos(json.loads(full_body)["items"])
+    new_videos = create_list_of_videos(orjson.loads(projected_body)["items"])
+
+    with app.test_request_context():
+        jsonify_us = per_call(lambda: jsonify(old_videos).get_data())
+
+    print(f"\n{n} results per page")
+    print(f"  bytes from YouTube   full: {len(full_body):>7,}   projected: {len(projected_body):>7,}"
+          f"   ({1 - len(projected_body) / len(full_body):.0%} less)")
+    print(f"  parse + reshape (us) old: {per_call(lambda: old_create_list_of_videos(json.loads(full_body)['items'])):>8.1f}"
+          f"   new: {per_call(lambda: create_list_of_videos(orjson.loads(projected_body)['items'])):>8.1f}")
+    print(f"  serialize (us)       jsonify: {jsonify_us:>8.1f}   orjson: {per_call(lambda: orjson.dumps(new_videos)):>8.1f}")
+
+
+if __name__ == "__main__":
+    for n in (20, 50):
+        bench(n)
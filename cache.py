@@ -0,0 +1,175 @@
+"""In-process caching helpers for Access Academy"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe cache whose entries expire after `ttl` seconds.
+
+    The cache holds at most `maxsize` entries; when full, the least
+    recently used entry is evicted to make room for a new one.
+
+    Hits, misses, and evictions are counted so the cache can be monitored.
+    """
+
+    def __init__(self, maxsize=256, ttl=300, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] > self._clock()
+
+    def get(self, key, default=None):
+        """Return the value stored under `key`, or `default` if it is
+        missing or has expired."""
+
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None or entry[1] <= self._clock():
+                self.misses += 1
+                return default
+
+            # mark entry as most recently used
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_stale(self, key, default=None):
+        """Return the value stored under `key` even if it has expired (but
+        has not been evicted yet). Use this when a fresh value cannot be
+        had."""
+
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None:
+                return default
+
+            self.stale_hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """Store `value` under `key`, evicting the least recently used
+        entries if the cache is full."""
+
+        expires = self._clock() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (value, expires)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Remove `key` from the cache and return its value."""
+
+        with self._lock:
+            entry = self._data.pop(key, None)
+
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        """Remove all entries (the counters are kept)."""
+
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Return the cache counters as a dict."""
+
+        lookups = self.hits + self.misses
+
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "staleHits": self.stale_hits,
+            "hitRate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into a single call.
+
+    The first caller for a key runs the function; callers that arrive while
+    it is still running wait for it and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Return fn(*args, **kwargs), sharing one call per `key` between
+        concurrent callers."""
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def stats(self):
+        """Return the call counters as a dict."""
+
+        return {
+            "inFlight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
+
+
+class _Call:
+    """A call in progress in a SingleFlight."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
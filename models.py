@@ -1,7 +1,10 @@
 """SQLAlchemy models for Access Academy"""
 
+from datetime import timedelta
+
 from flask_bcrypt import Bcrypt
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import insert
 
 bcrypt = Bcrypt()
 db = SQLAlchemy()
@@ -169,6 +172,27 @@ class Video(db.Model):
         db.Text,
     )
 
+    # player, duration and statistics are filled in from the YouTube Data API
+    # after the video is saved (see hydrate_videos in app.py)
+    embed_html = db.Column(
+        db.Text,
+    )
+
+    # length of the video in seconds
+    duration = db.Column(
+        db.Integer,
+    )
+
+    view_count = db.Column(
+        db.BigInteger,
+    )
+
+    # when the details above were last fetched; NULL until they have been
+    hydrated_at = db.Column(
+        db.DateTime(timezone=True),
+        index=True,
+    )
+
     videos_courses = db.relationship('VideoCourse', backref='video')
 
 
@@ -201,6 +225,217 @@ class VideoCourse(db.Model):
     db.UniqueConstraint(course_id, video_seq)
 
 
+class SearchCache(db.Model):
+    """YouTube keyword search results, shared by all app workers"""
+
+    __tablename__ = 'search_cache'
+
+    # keyword is normalized (case and whitespace folded) before storage
+    keyword = db.Column(
+        db.Text,
+        primary_key=True,
+    )
+
+    max_results = db.Column(
+        db.Integer,
+        primary_key=True,
+    )
+
+    # YouTube's token for this page of results ('' for the first page)
+    page_token = db.Column(
+        db.Text,
+        primary_key=True,
+        default='',
+    )
+
+    next_page_token = db.Column(
+        db.Text,
+    )
+
+    # list of videos, serialized as JSON exactly as sent by /api/get-videos
+    results = db.Column(
+        db.Text,
+        nullable=False,
+    )
+
+    fetched_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=db.func.now(),
+        index=True,
+    )
+
+    def __repr__(self):
+        """Create a readable, identifiable representation of search cache entry."""
+        return f"<SearchCache {self.keyword!r} ({self.max_results}, {self.page_token!r}): {self.fetched_at}>"
+
+    @classmethod
+    def lookup(cls, keyword, max_results, page_token, max_age=None):
+        """Return the cached page of results for a search if it was fetched
+        within the last `max_age` seconds; otherwise return None.
+        If max_age is None, return the page however old it is.
+        The page is returned as (results serialized as JSON, next page token)."""
+
+        query = (db.session
+                 .query(cls.results, cls.next_page_token)
+                 .filter(cls.keyword == keyword,
+                         cls.max_results == max_results,
+                         cls.page_token == page_token))
+
+        if max_age is not None:
+            query = query.filter(cls.fetched_at > db.func.now() - timedelta(seconds=max_age))
+
+        page = query.first()
+
+        return tuple(page) if page else None
+
+    @classmethod
+    def store(cls, keyword, max_results, page_token, results, next_page_token):
+        """Insert or replace a cached page of results (serialized as JSON)
+        for a search."""
+
+        if isinstance(results, bytes):
+            results = results.decode()
+
+        stmt = insert(cls.__table__).values(keyword=keyword,
+                                            max_results=max_results,
+                                            page_token=page_token,
+                                            results=results,
+                                            next_page_token=next_page_token,
+                                            fetched_at=db.func.now())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.keyword, cls.max_results, cls.page_token],
+            set_={"results": stmt.excluded.results,
+                  "next_page_token": stmt.excluded.next_page_token,
+                  "fetched_at": stmt.excluded.fetched_at})
+
+        db.session.execute(stmt)
+        db.session.commit()
+
+    @classmethod
+    def purge_stale(cls, max_age, batch_size=500):
+        """Delete entries older than `max_age` seconds.
+
+        Rows are deleted in small batches, each in its own short transaction,
+        and rows locked by in-flight requests are skipped, so the purge never
+        holds up request traffic.
+
+        Return the number of rows deleted."""
+
+        stmt = db.text("""DELETE FROM search_cache
+                          WHERE ctid IN (SELECT ctid FROM search_cache
+                                         WHERE fetched_at < now() - :max_age
+                                         LIMIT :batch_size
+                                         FOR UPDATE SKIP LOCKED)""")
+        deleted = 0
+
+        while True:
+            res = db.session.execute(stmt, {"max_age": timedelta(seconds=max_age),
+                                            "batch_size": batch_size})
+            db.session.commit()
+            deleted += res.rowcount
+
+            if res.rowcount < batch_size:
+                return deleted
+
+
+class QuotaUsage(db.Model):
+    """YouTube Data API quota units used per day, shared by all app workers"""
+
+    __tablename__ = 'quota_usage'
+
+    # YouTube resets quotas at midnight Pacific time
+    TODAY = db.func.date(db.func.timezone('America/Los_Angeles', db.func.now()))
+
+    day = db.Column(
+        db.Date,
+        primary_key=True,
+    )
+
+    units = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+    )
+
+    def __repr__(self):
+        """Create a readable, identifiable representation of quota usage."""
+        return f"<QuotaUsage {self.day}: {self.units}>"
+
+    @classmethod
+    def used_today(cls):
+        """Return the number of quota units used so far today."""
+
+        return db.session.query(cls.units).filter(cls.day == cls.TODAY).scalar() or 0
+
+    @classmethod
+    def charge(cls, units):
+        """Add `units` to today's usage and return today's total.
+
+        This runs in its own transaction, so it is recorded even if the
+        caller's session is later rolled back."""
+
+        table = cls.__table__
+        stmt = insert(table).values(day=cls.TODAY, units=units)
+        stmt = (stmt
+                .on_conflict_do_update(index_elements=[table.c.day],
+                                       set_={"units": table.c.units + stmt.excluded.units})
+                .returning(table.c.units))
+
+        with db.engine.begin() as conn:
+            return conn.execute(stmt).scalar()
+
+
+class RateLimit(db.Model):
+    """Token bucket limiting how often a user may call the API"""
+
+    __tablename__ = 'rate_limits'
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete="cascade"),
+        primary_key=True,
+    )
+
+    tokens = db.Column(
+        db.Float,
+        nullable=False,
+    )
+
+    updated_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=db.func.now(),
+    )
+
+    @classmethod
+    def consume(cls, user_id, rate, capacity):
+        """Take a token from the user's bucket, if there is one.
+
+        The bucket holds up to `capacity` tokens and refills at `rate` tokens
+        per second. Refill and take happen in a single statement, so the
+        bucket is shared safely between workers.
+
+        Return True if a token was taken, False if the bucket was empty."""
+
+        # the row is only updated (and so only returned) if a token is left
+        stmt = db.text("""
+            INSERT INTO rate_limits (user_id, tokens, updated_at)
+            VALUES (:user_id, :capacity - 1, now())
+            ON CONFLICT (user_id) DO UPDATE
+            SET tokens = LEAST(:capacity, rate_limits.tokens + :rate * EXTRACT(EPOCH FROM now() - rate_limits.updated_at)) - 1,
+                updated_at = now()
+            WHERE LEAST(:capacity, rate_limits.tokens + :rate * EXTRACT(EPOCH FROM now() - rate_limits.updated_at)) >= 1
+            RETURNING tokens""")
+
+        with db.engine.begin() as conn:
+            row = conn.execute(stmt, {"user_id": user_id,
+                                      "rate": rate,
+                                      "capacity": capacity}).first()
+
+        return row is not None
+
+
 def connect_db(app):
     """Connect this database to provided Flask app.
 
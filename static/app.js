@@ -2,26 +2,46 @@ const BASE_URL = "/api/get-videos";
 const form = document.querySelector('#keyword-search-form');
 const course_id = document.querySelector('#course-id').value;
 const searchResults = document.querySelector("#search-results");
+const searchResultsEnd = document.querySelector("#search-results-end");
 let keywordErr = document.querySelector("#keyword-err");
 
+// the current search; used to load more pages as the user scrolls
+let currKeyword = null;
+let nextPageToken = null;
+let loadingPage = false;
+let searchCount = 0;
+
+/** getVideosPage: make AJAX call to our Flask API for a page of videos */
+async function getVideosPage(keyword, pageToken) {
+  try {
+    const res = await axios({
+      method: 'post',
+      url: `${BASE_URL}`,
+      responseType: 'json',
+      data: {keyword, pageToken},
+    });
+    return res;
+  } catch (err) {
+    // error responses (e.g. 503 when YouTube is down) still carry error messages
+    if (err.response) {
+      return err.response;
+    }
+    throw err;
+  }
+}
+
 /** processKeywordSearchForm: get data from form and make AJAX call to Flask API */
 async function processKeywordSearchForm(evt) {
   evt.preventDefault();
   // get data from keyword search form
   const keyword = document.querySelector("#keyword").value;
-  const formData = {keyword};
-  // CHANGE: remove console.log
-  console.log("keyword: ", keyword, "formData: ", formData);
-
-  // make AJAX call to our Flask API
-  const res = await axios({
-    method: 'post',
-    url: `${BASE_URL}`,
-    responseType: 'json',
-    data: formData,
-  });
-  console.log("res: ", res);
-  return res;
+
+  // start a new search
+  currKeyword = keyword;
+  nextPageToken = null;
+  searchCount++;
+
+  return await getVideosPage(keyword, null);
 }
 
 /** handleResponse: deal with response from our get-videos app */
@@ -36,48 +56,95 @@ function handleResponse(res) {
       keywordErr.innerText = res_errors["keyword"][0];
     }
   } else {
-    const videos = res['data'];
-    for (let video of videos) {
-      const ytVideoId = video['ytVideoId'];
-      const title = video['title'];
-      const channelId = video['channelId'];
-      const channelTitle = video['channelTitle'];
-      const description = video['description'];
-      const thumbUrl = video["thumb_url_medium"];
-
-      const div = document.createElement("div");
-      div.setAttribute("data-id", `${ytVideoId}`);
-      div.setAttribute("class", "card mb-3");
-      div.innerHTML = 
-      `<div class="row no-gutters justify-content-center">
-        <div class="col-8 col-md-4 image-container">
-          <img src="${thumbUrl}" class="course-img">
-        </div>
-        <div class="col-8 col-md-8">
-          <div class="card-body">
-            <h5 class="card-title">${title}</h5>
-            <p class="card-subtitle mb-2">Created by: ${channelTitle}</p>
-            <p class="card-text">${description}</p>
-            <form action="../../../courses/${course_id}/videos/${ytVideoId}/add" method="POST">
-              <input type="hidden" id="v-yt-id" name="v-yt-id" value="${ytVideoId}">
-              <input type="hidden" id="v-title" name="v-title" value="${title}">
-              <input type="hidden" id="v-description" name="v-description" value="${description}">
-              <input type="hidden" id="v-channelId" name="v-channelId" value="${channelId}">
-              <input type="hidden" id="v-channelTitle" name="v-channelTitle" value="${channelTitle}">
-              <input type="hidden" id="v-thumb_url" name="v-thumb-url" value="${thumbUrl}">
-              <button type="submit" class="btn btn-primary">Add to course</button>
-            </form>
-          </div>
-        </div>
-      </div>`;
-      searchResults.append(
-        div
-      );
+    // results served from cache while YouTube is unavailable may be out of date
+    if (res.headers['x-cache'] === 'STALE') {
+      const notice = document.createElement("p");
+      notice.setAttribute("class", "alert alert-warning");
+      notice.innerText = "Fresh results are not available right now, so these results may be out of date.";
+      searchResults.append(notice);
     }
+    appendVideos(res);
     form.reset();
   }
 }
 
+/** appendVideos: add a page of video cards below the ones already shown */
+function appendVideos(res) {
+  nextPageToken = res.headers['x-next-page-token'] || null;
+
+  const videos = res['data'];
+  for (let video of videos) {
+    const ytVideoId = video['ytVideoId'];
+    const title = video['title'];
+    const channelId = video['channelId'];
+    const channelTitle = video['channelTitle'];
+    const description = video['description'];
+    const thumbUrl = video["thumb_url_medium"];
+
+    const div = document.createElement("div");
+    div.setAttribute("data-id", `${ytVideoId}`);
+    div.setAttribute("class", "card mb-3");
+    div.innerHTML = 
+    `<div class="row no-gutters justify-content-center">
+      <div class="col-8 col-md-4 image-container">
+        <img src="${thumbUrl}" class="course-img">
+      </div>
+      <div class="col-8 col-md-8">
+        <div class="card-body">
+          <h5 class="card-title">${title}</h5>
+          <p class="card-subtitle mb-2">Created by: ${channelTitle}</p>
+          <p class="card-text">${description}</p>
+          <form action="../../../courses/${course_id}/videos/${ytVideoId}/add" method="POST">
+            <input type="hidden" id="v-yt-id" name="v-yt-id" value="${ytVideoId}">
+            <input type="hidden" id="v-title" name="v-title" value="${title}">
+            <input type="hidden" id="v-description" name="v-description" value="${description}">
+            <input type="hidden" id="v-channelId" name="v-channelId" value="${channelId}">
+            <input type="hidden" id="v-channelTitle" name="v-channelTitle" value="${channelTitle}">
+            <input type="hidden" id="v-thumb_url" name="v-thumb-url" value="${thumbUrl}">
+            <button type="submit" class="btn btn-primary">Add to course</button>
+          </form>
+        </div>
+      </div>
+    </div>`;
+    searchResults.append(
+      div
+    );
+  }
+  watchResultsEnd();
+}
+
+/** loadNextPage: get the next page of results for the current search and add it to the page */
+async function loadNextPage() {
+  if (loadingPage || !nextPageToken) {
+    return;
+  }
+  loadingPage = true;
+  const search = searchCount;
+
+  try {
+    const res = await getVideosPage(currKeyword, nextPageToken);
+    // drop the page if a new search was started while it was loading
+    if (search === searchCount && !res["data"]["errors"]) {
+      appendVideos(res);
+    }
+  } finally {
+    loadingPage = false;
+  }
+}
+
+// fetch the next page while the user is still well above the end of the results
+const resultsEndObserver = new IntersectionObserver(function(entries) {
+  if (entries.some(entry => entry.isIntersecting)) {
+    loadNextPage();
+  }
+}, {rootMargin: "0px 0px 1500px 0px"});
+
+/** watchResultsEnd: (re)start watching the end of the results, so a short page triggers another load right away */
+function watchResultsEnd() {
+  resultsEndObserver.unobserve(searchResultsEnd);
+  resultsEndObserver.observe(searchResultsEnd);
+}
+
 form.addEventListener("submit", async function(evt) {
   res = await processKeywordSearchForm(evt); // response from Flask backend API
 
@@ -0,0 +1,128 @@
+"""Cache helper tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_cache.py
+
+import threading
+import time
+from unittest import TestCase
+
+from cache import TTLCache, SingleFlight
+
+
+class FakeClock:
+    """Clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TTLCacheTestCase(TestCase):
+    """Test TTLCache"""
+
+    def setUp(self):
+        """Create a small cache with a controllable clock."""
+
+        self.clock = FakeClock()
+        self.cache = TTLCache(maxsize=2, ttl=10, clock=self.clock)
+
+    def test_hit_and_miss(self):
+        """A stored value should be returned and counted as a hit."""
+
+        self.assertIsNone(self.cache.get("python"))
+        self.cache.set("python", [1, 2, 3])
+
+        self.assertEqual(self.cache.get("python"), [1, 2, 3])
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_expiry(self):
+        """An entry should not be returned once its ttl has passed."""
+
+        self.cache.set("python", "videos")
+        self.clock.now = 9
+        self.assertEqual(self.cache.get("python"), "videos")
+
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get("python"))
+        self.assertNotIn("python", self.cache)
+
+    def test_lru_eviction(self):
+        """The least recently used entry should be evicted when the cache is full."""
+
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        # touch "a" so "b" becomes the least recently used entry
+        self.cache.get("a")
+        self.cache.set("c", 3)
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertEqual(self.cache.get("c"), 3)
+
+    def test_stats(self):
+        """Stats should report the counters and the hit rate."""
+
+        self.cache.set("a", 1)
+        self.cache.get("a")
+        self.cache.get("b")
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hitRate"], 0.5)
+
+
+class SingleFlightTestCase(TestCase):
+    """Test SingleFlight"""
+
+    def test_concurrent_calls_coalesced(self):
+        """Concurrent calls for the same key should share one call."""
+
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def search(keyword):
+            calls.append(keyword)
+            release.wait(5)
+            return [keyword]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("python", search, "python")))
+                   for i in range(5)]
+
+        for thread in threads:
+            thread.start()
+
+        # wait until every thread has joined the call, then let it finish
+        while flight.calls + flight.coalesced < 5:
+            time.sleep(0.01)
+        release.set()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, ["python"])
+        self.assertEqual(results, [["python"]] * 5)
+        self.assertEqual(flight.coalesced, 4)
+
+    def test_errors_not_remembered(self):
+        """A failed call should raise for the caller and not be remembered."""
+
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("upstream error")
+
+        with self.assertRaises(ValueError):
+            flight.do("python", fail)
+
+        self.assertEqual(flight.do("python", lambda: "ok"), "ok")
+        self.assertEqual(flight.stats()["inFlight"], 0)
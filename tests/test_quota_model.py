@@ -0,0 +1,85 @@
+"""QuotaUsage and RateLimit model tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_quota_model.py
+
+
+import os
+from unittest import TestCase
+
+from models import db, User, QuotaUsage, RateLimit
+
+# BEFORE we import our app, let's set an environmental variable
+# to use a different database for tests (we need to do this
+# before we import our app, since that will have already
+# connected to the database
+
+os.environ['DATABASE_URL'] = "postgresql:///access-academy-test"
+
+# Now we can import app
+from app import app
+
+# Create our tables (we do this here, so we only create the tables
+# once for all tests --- in each test, we'll delete the data
+# and create fresh new clean test data
+
+db.create_all()
+
+
+class QuotaModelTestCase(TestCase):
+    """Test QuotaUsage and RateLimit Models"""
+
+    # runs before each test
+    def setUp(self):
+        """Add sample data."""
+
+        db.drop_all()
+        db.create_all()
+
+        user1 = User.signup("allison@allison.com", "allison", "allison", "Allison", "McAllison", None)
+        user1.id = 1111
+
+        db.session.commit()
+
+        self.user1 = user1
+
+    # runs after each test
+    def tearDown(self):
+        """Remove sample data."""
+
+        db.session.rollback()
+
+    def test_quota_charge(self):
+        """Charges should add up to today's usage."""
+
+        self.assertEqual(QuotaUsage.used_today(), 0)
+
+        self.assertEqual(QuotaUsage.charge(100), 100)
+        self.assertEqual(QuotaUsage.charge(1), 101)
+
+        self.assertEqual(QuotaUsage.used_today(), 101)
+        self.assertEqual(QuotaUsage.query.count(), 1)
+
+    def test_rate_limit(self):
+        """A user should be able to take only as many tokens as the bucket holds."""
+
+        taken = [RateLimit.consume(self.user1.id, rate=0.001, capacity=3) for i in range(4)]
+
+        self.assertEqual(taken, [True, True, True, False])
+
+    def test_rate_limit_refill(self):
+        """The bucket should refill over time."""
+
+        for i in range(3):
+            RateLimit.consume(self.user1.id, rate=0.001, capacity=3)
+
+        # pretend the last token was taken a minute ago
+        RateLimit.query.filter(RateLimit.user_id == self.user1.id).update(
+            {"updated_at": db.func.now() - db.text("interval '60 seconds'")},
+            synchronize_session=False)
+        db.session.commit()
+
+        self.assertTrue(RateLimit.consume(self.user1.id, rate=1 / 30, capacity=3))
+        self.assertTrue(RateLimit.consume(self.user1.id, rate=1 / 30, capacity=3))
+        self.assertFalse(RateLimit.consume(self.user1.id, rate=1 / 30, capacity=3))
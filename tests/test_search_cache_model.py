@@ -0,0 +1,103 @@
+"""SearchCache model tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_search_cache_model.py
+
+
+import os
+from datetime import timedelta
+from unittest import TestCase
+
+from models import db, SearchCache
+
+# BEFORE we import our app, let's set an environmental variable
+# to use a different database for tests (we need to do this
+# before we import our app, since that will have already
+# connected to the database
+
+os.environ['DATABASE_URL'] = "postgresql:///access-academy-test"
+
+# Now we can import app
+from app import app
+
+# Create our tables (we do this here, so we only create the tables
+# once for all tests --- in each test, we'll delete the data
+# and create fresh new clean test data
+
+db.create_all()
+
+
+class SearchCacheModelTestCase(TestCase):
+    """Test SearchCache Model"""
+
+    # runs before each test
+    def setUp(self):
+        """Add sample data."""
+
+        db.drop_all()
+        db.create_all()
+
+        self.videos = '[{"ytVideoId": "yfoY53QXEnI", "title": "CSS Crash Course"}]'
+        SearchCache.store("css", 20, "", self.videos, "CBQQAA")
+
+    # runs after each test
+    def tearDown(self):
+        """Remove sample data."""
+
+        db.session.rollback()
+
+    def age_entry(self, keyword, seconds):
+        """Make a cache entry look `seconds` old."""
+
+        SearchCache.query.filter(SearchCache.keyword == keyword).update(
+            {"fetched_at": db.func.now() - timedelta(seconds=seconds)},
+            synchronize_session=False)
+        db.session.commit()
+
+    def test_lookup(self):
+        """Stored results should be returned for the same keyword and result count only."""
+
+        self.assertEqual(SearchCache.lookup("css", 20, "", 60), (self.videos, "CBQQAA"))
+        self.assertIsNone(SearchCache.lookup("css", 50, "", 60))
+        self.assertIsNone(SearchCache.lookup("css", 20, "CBQQAA", 60))
+        self.assertIsNone(SearchCache.lookup("html", 20, "", 60))
+
+    def test_store_upsert(self):
+        """Storing results for a cached search should replace them."""
+
+        newer = '[{"ytVideoId": "1PnVor36_40", "title": "CSS Grid"}]'
+        SearchCache.store("css", 20, "", newer, "CBQQAQ")
+
+        self.assertEqual(SearchCache.query.count(), 1)
+        self.assertEqual(SearchCache.lookup("css", 20, "", 60), (newer, "CBQQAQ"))
+
+    def test_pages_cached_separately(self):
+        """Each page of results for a search should have its own entry."""
+
+        page2 = '[{"ytVideoId": "1PnVor36_40", "title": "CSS Grid"}]'
+        SearchCache.store("css", 20, "CBQQAA", page2, None)
+
+        self.assertEqual(SearchCache.lookup("css", 20, "", 60), (self.videos, "CBQQAA"))
+        self.assertEqual(SearchCache.lookup("css", 20, "CBQQAA", 60), (page2, None))
+
+    def test_lookup_expired(self):
+        """Results older than max_age should not be returned."""
+
+        self.age_entry("css", 120)
+
+        self.assertIsNone(SearchCache.lookup("css", 20, "", 60))
+        self.assertIsNotNone(SearchCache.lookup("css", 20, ""))
+
+    def test_purge_stale(self):
+        """Purging should delete only expired entries."""
+
+        SearchCache.store("html", 20, "", self.videos, None)
+        SearchCache.store("flask", 20, "", self.videos, None)
+        self.age_entry("css", 120)
+        self.age_entry("html", 120)
+
+        deleted = SearchCache.purge_stale(60, batch_size=1)
+
+        self.assertEqual(deleted, 2)
+        self.assertEqual([e.keyword for e in SearchCache.query.all()], ["flask"])
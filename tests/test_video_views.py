@@ -4,8 +4,13 @@
 #
 #    python -m unittest test_videos_views.py
 
+import json
 import os
 from unittest import TestCase
+from unittest.mock import patch
+
+import orjson
+
 from models import db, User, Course, Video, VideoCourse
 
 # BEFORE we import our app, let's set an environmental variable
@@ -16,7 +21,8 @@ from models import db, User, Course, Video, VideoCourse
 os.environ['DATABASE_URL'] = "postgresql:///access-academy-test"
 
 # Now we can import app
-from app import app, CURR_USER_KEY
+from app import (app, CURR_USER_KEY, search_cache, yt_client, create_list_of_videos,
+                 hydrate_videos, save_video_details)
 
 app.config['TESTING'] = True
 app.config['DEBUG_TB_HOSTS'] = ['dont-show-debug-toolbar']
@@ -114,6 +120,108 @@ class VideoViewTestCase(TestCase):
         self.assertEqual(len(res2.json), 20)
         self.assertIn("CSS", res2.json[0]["title"])
 
+    def test_search_videos_cached(self):
+        """A repeated keyword search should be served from the search cache, regardless of case or spacing."""
+
+        cached = [{"ytVideoId": "yfoY53QXEnI", "title": "CSS Crash Course"}]
+        search_cache.set(("css for beginners", 20, ""), (json.dumps(cached), "CBQQAA"))
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user2.id
+
+            hits = search_cache.hits
+            res = c.post("/api/get-videos", json={"keyword": "  CSS  for Beginners "})
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.json, cached)
+            self.assertEqual(res.headers["X-Next-Page-Token"], "CBQQAA")
+            self.assertEqual(search_cache.hits, hits + 1)
+
+        search_cache.clear()
+
+    def test_search_videos_next_page(self):
+        """A page token should fetch the matching page of results, which is cached separately."""
+
+        page2 = [{"ytVideoId": "1PnVor36_40", "title": "CSS Grid"}]
+        search_cache.set(("css for beginners", 20, ""), ("[]", "CBQQAA"))
+        search_cache.set(("css for beginners", 20, "CBQQAA"), (json.dumps(page2), None))
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user2.id
+
+            res = c.post("/api/get-videos", json={"keyword": "CSS for beginners", "pageToken": "CBQQAA"})
+
+            self.assertEqual(res.json, page2)
+            self.assertNotIn("X-Next-Page-Token", res.headers)
+
+        search_cache.clear()
+
+    def test_search_videos_stale_when_youtube_down(self):
+        """While YouTube is down, the last known results for a keyword should be served and flagged as stale."""
+
+        stale = [{"ytVideoId": "yfoY53QXEnI", "title": "CSS Crash Course"}]
+        search_cache.set(("css for beginners", 20, ""), (json.dumps(stale), None), ttl=0)
+
+        # trip the circuit breaker so YouTube is not called
+        for i in range(yt_client.breaker.failure_threshold):
+            yt_client.breaker.record_failure()
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user2.id
+
+            res1 = c.post("/api/get-videos", json={"keyword": "CSS for beginners"})
+
+            self.assertEqual(res1.status_code, 200)
+            self.assertEqual(res1.json, stale)
+            self.assertEqual(res1.headers["X-Cache"], "STALE")
+
+            # a keyword with no earlier results gets an error message
+            res2 = c.post("/api/get-videos", json={"keyword": "HTML"})
+
+            self.assertEqual(res2.status_code, 503)
+            self.assertIn("keyword", res2.json["errors"])
+
+        yt_client.breaker.reset()
+        search_cache.clear()
+
+    def test_search_videos_rate_limited(self):
+        """A user who searches too quickly should be told to slow down."""
+
+        search_cache.set(("css", 20, ""), ("[]", None))
+        app.config['SEARCH_RATE_BURST'] = 2
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user2.id
+
+            statuses = [c.post("/api/get-videos", json={"keyword": "css"}).status_code for i in range(3)]
+            self.assertEqual(statuses, [200, 200, 429])
+
+        app.config['SEARCH_RATE_BURST'] = 10
+        search_cache.clear()
+
+
+    def test_create_list_of_videos(self):
+        """Projected YouTube search items should become records that serialize with the keys app.js uses."""
+
+        items = [{"id": {"videoId": "yfoY53QXEnI"},
+                  "snippet": {"title": "CSS Crash Course",
+                              "channelId": "video1video1",
+                              "channelTitle": "Video1 Channel",
+                              "description": "Desc for Video1",
+                              "thumbnails": {"high": {"url": "https://i.ytimg.com/vi/yfoY53QXEnI/hqdefault.jpg"}}}}]
+
+        videos = json.loads(orjson.dumps(create_list_of_videos(items)))
+
+        self.assertEqual(videos, [{"ytVideoId": "yfoY53QXEnI",
+                                   "title": "CSS Crash Course",
+                                   "channelId": "video1video1",
+                                   "channelTitle": "Video1 Channel",
+                                   "description": "Desc for Video1",
+                                   "thumb_url_medium": "https://i.ytimg.com/vi/yfoY53QXEnI/hqdefault.jpg"}])
 
     def test_search_videos_not_creator_fail(self):
         """A logged in user should not be able to search for videos to add to a course he/she did not create."""
@@ -168,6 +276,64 @@ class VideoViewTestCase(TestCase):
             course = Course.query.filter(Course.creator_id == 2222).first()
             self.assertEqual(len(course.videos), 3)
 
+    def test_add_video_to_course_hydrates(self):
+        """Adding a new video should fetch its details from YouTube in the background."""
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user2.id
+
+            with patch("app.hydrate_in_background") as hydrate:
+                c.post("/courses/1/videos/1Rs2ND1ryYc/add",
+                       data={"v-title": "New Video Title",
+                             "v-channelId": "New Video Channel Id"})
+
+            hydrate.assert_called_once_with(["1Rs2ND1ryYc"])
+
+    # ****************************
+    # Test video details
+    # ****************************
+
+    def test_hydrate_videos_batched(self):
+        """Video details should be fetched at most 50 ids per call and returned keyed by id."""
+
+        def videos(yt_video_ids, **params):
+            return {"items": [{"id": yt_video_id} for yt_video_id in yt_video_ids]}
+
+        yt_video_ids = [f"video{i:03d}" for i in range(120)]
+
+        with patch.object(yt_client, "videos", side_effect=videos) as get:
+            details = hydrate_videos(yt_video_ids + yt_video_ids[:10])
+
+        self.assertEqual(get.call_count, 3)
+        self.assertEqual(sorted(len(call[0][0]) for call in get.call_args_list), [20, 50, 50])
+        self.assertEqual(sorted(details), yt_video_ids)
+
+    def test_save_video_details(self):
+        """Fetched details should be stored on the videos and shown on the course page."""
+
+        details = {"yfoY53QXEnI": {"id": "yfoY53QXEnI",
+                                   "player": {"embedHtml": "<iframe></iframe>"},
+                                   "contentDetails": {"duration": "PT12M34S"},
+                                   "statistics": {"viewCount": "1234567"}},
+                   "notInTheDb1": {"id": "notInTheDb1"}}
+
+        self.assertEqual(save_video_details(details), 1)
+
+        video = Video.query.get(self.v1.id)
+        self.assertEqual(video.embed_html, "<iframe></iframe>")
+        self.assertEqual(video.duration, 754)
+        self.assertEqual(video.view_count, 1234567)
+        self.assertIsNotNone(video.hydrated_at)
+        self.assertIsNone(Video.query.get(self.v2.id).hydrated_at)
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.user1.id
+
+            res = c.get(f"/courses/{self.c.id}")
+            self.assertIn("12:34 &middot; 1,234,567 views", str(res.data))
+
 
     def test_add_video_to_course_not_creator_fail(self):
         """A logged in user should not be able to add a video to a course he/she did not create."""
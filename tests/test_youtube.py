@@ -0,0 +1,209 @@
+"""YouTube client tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_youtube.py
+
+from unittest import TestCase
+from unittest.mock import patch, Mock
+
+import orjson
+
+from youtube import (YouTubeClient, YouTubeAPIError, CircuitBreaker, CircuitOpenError,
+                     QuotaBudget, QuotaExceededError)
+
+
+class FakeClock:
+    """Clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeLedger:
+    """In-memory quota ledger."""
+
+    def __init__(self, used=0):
+        self.used = used
+
+    def used_today(self):
+        return self.used
+
+    def charge(self, units):
+        self.used += units
+
+
+def make_response(status, json_data):
+    """Make a stand-in for a requests response."""
+
+    res = Mock()
+    res.status_code = status
+    res.ok = status < 400
+    res.json.return_value = json_data
+    res.content = orjson.dumps(json_data)
+    return res
+
+
+class YouTubeClientTestCase(TestCase):
+    """Test YouTubeClient"""
+
+    def setUp(self):
+        """Create a client that does not sleep between retries."""
+
+        self.client = YouTubeClient("https://yt.test/youtube/v3", "secret", backoff=0)
+
+    def test_search(self):
+        """A search should send encoded query parameters with bounded timeouts."""
+
+        with patch.object(self.client.session, "get", return_value=make_response(200, {"items": []})) as get:
+            res = self.client.search("c++ & css", 20)
+
+        self.assertEqual(res, {"items": []})
+        args, kwargs = get.call_args
+        self.assertEqual(args[0], "https://yt.test/youtube/v3/search")
+        self.assertEqual(kwargs["params"]["q"], "c++ & css")
+        self.assertEqual(kwargs["params"]["key"], "secret")
+        self.assertEqual(kwargs["timeout"], self.client.timeout)
+
+    def test_retry_on_server_error(self):
+        """5xx responses should be retried."""
+
+        responses = [make_response(503, {}), make_response(200, {"items": [1]})]
+
+        with patch.object(self.client.session, "get", side_effect=responses):
+            res = self.client.search("css", 20)
+
+        self.assertEqual(res, {"items": [1]})
+        self.assertEqual(self.client.retries, 1)
+
+    def test_no_retry_on_quota_error(self):
+        """A 403 (e.g. quotaExceeded) should fail immediately."""
+
+        body = {"error": {"errors": [{"reason": "quotaExceeded"}]}}
+
+        with patch.object(self.client.session, "get", return_value=make_response(403, body)) as get:
+            with self.assertRaises(YouTubeAPIError) as context:
+                self.client.search("css", 20)
+
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(context.exception.status, 403)
+        self.assertEqual(context.exception.reason, "quotaExceeded")
+
+    def test_gives_up_after_max_retries(self):
+        """Errors that persist should be raised once retries are used up."""
+
+        with patch.object(self.client.session, "get", return_value=make_response(500, {})) as get:
+            with self.assertRaises(YouTubeAPIError):
+                self.client.search("css", 20)
+
+        self.assertEqual(get.call_count, self.client.max_retries + 1)
+        self.assertEqual(self.client.failures, 1)
+
+    def test_circuit_opens_after_failures(self):
+        """Once the breaker opens, calls should fail fast without reaching YouTube."""
+
+        self.client.breaker = CircuitBreaker(failure_threshold=2)
+
+        with patch.object(self.client.session, "get", return_value=make_response(500, {})) as get:
+            for i in range(2):
+                with self.assertRaises(YouTubeAPIError):
+                    self.client.search("css", 20)
+
+            calls = get.call_count
+
+            with self.assertRaises(CircuitOpenError):
+                self.client.search("css", 20)
+
+        self.assertEqual(get.call_count, calls)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.OPEN)
+
+
+class CircuitBreakerTestCase(TestCase):
+    """Test CircuitBreaker"""
+
+    def setUp(self):
+        """Create a breaker with a controllable clock."""
+
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30,
+                                      latency_slo=2, clock=self.clock)
+
+    def test_trips_on_consecutive_failures(self):
+        """Only consecutive failures should trip the breaker."""
+
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success(0.1)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_trips_on_slow_calls(self):
+        """Calls slower than the latency SLO should count as failures."""
+
+        for i in range(3):
+            self.breaker.record_success(5)
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_half_open_trial(self):
+        """After the reset timeout, one trial call should be allowed through."""
+
+        for i in range(3):
+            self.breaker.record_failure()
+
+        self.clock.now = 30
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        # a failed trial re-opens the breaker
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        # a successful trial closes it
+        self.clock.now = 60
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success(0.1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.trips, 2)
+
+
+class QuotaBudgetTestCase(TestCase):
+    """Test QuotaBudget"""
+
+    def test_calls_charged(self):
+        """Each call should be charged its unit cost, including retries."""
+
+        ledger = FakeLedger()
+        client = YouTubeClient("https://yt.test/youtube/v3", "secret", backoff=0,
+                               quota=QuotaBudget(ledger))
+        responses = [make_response(503, {}), make_response(200, {"items": []}),
+                     make_response(200, {"items": []})]
+
+        with patch.object(client.session, "get", side_effect=responses):
+            client.search("css", 20)
+            client.videos("yfoY53QXEnI")
+
+        self.assertEqual(ledger.used, 201)
+
+    def test_search_stops_at_reserve(self):
+        """Searches should be refused once only the reserve is left, but cheap calls should not."""
+
+        budget = QuotaBudget(FakeLedger(used=9450), daily_limit=10000, reserve=500)
+
+        with self.assertRaises(QuotaExceededError):
+            budget.check("search")
+
+        budget.check("videos")
+
+        budget.ledger.used = 10000
+        with self.assertRaises(QuotaExceededError):
+            budget.check("videos")
@@ -0,0 +1,92 @@
+"""YouTube stub server tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_youtube_stub.py
+
+import threading
+from unittest import TestCase
+
+from werkzeug.serving import make_server
+
+import youtube_stub
+from youtube import YouTubeClient, YouTubeAPIError
+
+
+class YouTubeStubTestCase(TestCase):
+    """Test the YouTube stub server"""
+
+    def setUp(self):
+        """Reset the injected faults and create a test client."""
+
+        youtube_stub.app.config['STUB'].update(latency_ms=0, latency_jitter_ms=0,
+                                               error_rate=0, quota_error_rate=0)
+        self.client = youtube_stub.app.test_client()
+
+    def test_search(self):
+        """A search should return maxResults results, best matches first, and a next page token."""
+
+        res = self.client.get("/youtube/v3/search?part=snippet&q=css&maxResults=20")
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.json["items"]), 20)
+        self.assertIn("CSS", res.json["items"][0]["snippet"]["title"])
+        self.assertIn("nextPageToken", res.json)
+
+    def test_search_pages(self):
+        """Following the next page token should give different results."""
+
+        page1 = self.client.get("/youtube/v3/search?q=css&maxResults=20").json
+        page2 = self.client.get(f"/youtube/v3/search?q=css&maxResults=20&pageToken={page1['nextPageToken']}").json
+
+        ids1 = {item["id"]["videoId"] for item in page1["items"]}
+        ids2 = {item["id"]["videoId"] for item in page2["items"]}
+
+        self.assertEqual(len(ids1 | ids2), 40)
+
+    def test_videos(self):
+        """Videos should be returned for each requested id."""
+
+        res = self.client.get("/youtube/v3/videos?part=player&id=yfoY53QXEnI,1Rs2ND1ryYc")
+
+        self.assertEqual([item["id"] for item in res.json["items"]], ["yfoY53QXEnI", "1Rs2ND1ryYc"])
+        self.assertIn("embedHtml", res.json["items"][0]["player"])
+
+    def test_playlist_items(self):
+        """Playlist items should be returned in position order."""
+
+        res = self.client.get("/youtube/v3/playlistItems?playlistId=PL1&maxResults=5")
+
+        self.assertEqual([item["snippet"]["position"] for item in res.json["items"]], [0, 1, 2, 3, 4])
+
+    def test_injected_errors(self):
+        """Configured error rates should produce server and quota errors."""
+
+        self.client.post("/_stub/config", json={"error_rate": 1})
+        res = self.client.get("/youtube/v3/search?q=css")
+        self.assertEqual(res.status_code, 503)
+
+        self.client.post("/_stub/config", json={"error_rate": 0, "quota_error_rate": 1})
+        res = self.client.get("/youtube/v3/search?q=css")
+        self.assertEqual(res.status_code, 403)
+        self.assertEqual(res.json["error"]["errors"][0]["reason"], "quotaExceeded")
+
+    def test_youtube_client(self):
+        """The app's YouTube client should work against the stub over HTTP."""
+
+        server = make_server("127.0.0.1", 0, youtube_stub.app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        try:
+            client = YouTubeClient(f"http://127.0.0.1:{server.server_port}/youtube/v3", "key", backoff=0)
+
+            res = client.search("css for beginners", 20)
+            self.assertEqual(len(res["items"]), 20)
+
+            youtube_stub.app.config['STUB']["quota_error_rate"] = 1
+            with self.assertRaises(YouTubeAPIError) as context:
+                client.search("css for beginners", 20)
+            self.assertEqual(context.exception.reason, "quotaExceeded")
+        finally:
+            server.shutdown()
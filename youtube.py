@@ -0,0 +1,377 @@
+"""YouTube Data API client for Access Academy"""
+
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+
+
+@dataclass
+class VideoResult:
+    """A video found by a keyword search.
+    Attribute names match the keys sent to the browser by /api/get-videos."""
+
+    __slots__ = ("ytVideoId", "title", "channelId", "channelTitle",
+                 "description", "thumb_url_medium")
+
+    ytVideoId: str
+    title: str
+    channelId: str
+    channelTitle: str
+    description: str
+    thumb_url_medium: str
+
+
+class YouTubeAPIError(Exception):
+    """The YouTube Data API could not be reached or returned an error."""
+
+    def __init__(self, message, status=None, reason=None):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+
+class QuotaExceededError(YouTubeAPIError):
+    """The daily quota budget does not allow the call, so it was not attempted."""
+
+
+class CircuitOpenError(YouTubeAPIError):
+    """The circuit breaker is open, so the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Stop calling a failing service for a while.
+
+    The breaker opens after `failure_threshold` consecutive failures, where a
+    call slower than `latency_slo` seconds also counts as a failure. While
+    open, calls are refused. After `reset_timeout` seconds one trial call is
+    let through (half-open): success closes the breaker, failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, latency_slo=2.0,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency_slo = latency_slo
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self._state = self.CLOSED
+        self._opened_at = None
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        """Current state; an open breaker reports half-open once it is ready
+        to let a trial call through."""
+
+        if (self._state == self.OPEN
+                and self._clock() - self._opened_at >= self.reset_timeout):
+            return self.HALF_OPEN
+        return self._state
+
+    def allow(self):
+        """Return True if a call may be made now."""
+
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+
+            if self.state == self.HALF_OPEN and self._state == self.OPEN:
+                # let a single trial call through
+                self._state = self.HALF_OPEN
+                return True
+
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency):
+        """Record a completed call that took `latency` seconds."""
+
+        if latency > self.latency_slo:
+            self.record_failure()
+            return
+
+        with self._lock:
+            self._state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        """Record a failed call, opening the breaker if need be."""
+
+        with self._lock:
+            self.failures += 1
+
+            if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.trips += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+    def reset(self):
+        """Close the breaker."""
+
+        with self._lock:
+            self._state = self.CLOSED
+            self.failures = 0
+
+    def stats(self):
+        """Return the breaker state and counters as a dict."""
+
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+class QuotaBudget:
+    """Daily YouTube Data API quota budget.
+
+    Every call is charged its unit cost in `ledger`, which must provide
+    `used_today()` and `charge(units)` (e.g. the QuotaUsage model, so that
+    all workers share one budget).
+
+    Searches stop once they would eat into the last `reserve` units, which
+    are kept back for cheap calls such as fetching video details.
+    """
+
+    COSTS = {
+        "search": 100,
+        "videos": 1,
+        "playlistItems": 1,
+    }
+
+    def __init__(self, ledger, daily_limit=10000, reserve=500):
+        self.ledger = ledger
+        self.daily_limit = daily_limit
+        self.reserve = reserve
+
+    def cost(self, endpoint):
+        """Return the unit cost of a call to `endpoint`."""
+
+        return self.COSTS.get(endpoint, 1)
+
+    def check(self, endpoint):
+        """Raise QuotaExceededError if there is not enough budget left today
+        for a call to `endpoint`."""
+
+        limit = self.daily_limit
+
+        if self.cost(endpoint) > 1:
+            limit -= self.reserve
+
+        if self.ledger.used_today() + self.cost(endpoint) > limit:
+            raise QuotaExceededError(f"YouTube {endpoint} request not attempted: daily quota budget used up")
+
+    def charge(self, endpoint):
+        """Record a call to `endpoint`."""
+
+        self.ledger.charge(self.cost(endpoint))
+
+    def stats(self):
+        """Return the budget and today's usage as a dict."""
+
+        return {
+            "dailyLimit": self.daily_limit,
+            "reserve": self.reserve,
+            "usedToday": self.ledger.used_today(),
+        }
+
+
+class YouTubeClient:
+    """Client for the YouTube Data API.
+
+    All outbound YouTube traffic goes through one of these. It keeps a
+    pooled, keep-alive session so repeat calls reuse TLS connections,
+    bounds every call with connect/read timeouts, and retries 429 and 5xx
+    responses (and network errors) with jittered exponential backoff.
+
+    Calls go through a circuit breaker: while YouTube is failing or slow,
+    calls fail fast with CircuitOpenError instead of tying up a worker.
+    If a quota budget is given, calls are charged against it and refused
+    with QuotaExceededError once it runs low.
+
+    Create one per worker and share it between requests.
+    """
+
+    RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+    # errors caused by a bad request rather than a YouTube outage
+    CLIENT_ERROR_STATUSES = frozenset([400, 404])
+
+    # most ids a videos request may ask for
+    MAX_IDS_PER_CALL = 50
+
+    def __init__(self, base_url, api_key, connect_timeout=3.05, read_timeout=10,
+                 max_retries=2, backoff=0.25, pool_size=10, breaker=None, quota=None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.quota = quota
+
+        # retries are handled here rather than by urllib3 so they get jitter
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def get(self, endpoint, **params):
+        """Call `endpoint` with the given query parameters.
+        Return the decoded JSON response.
+        Raise YouTubeAPIError if the call still fails after retrying,
+        QuotaExceededError if the quota budget does not allow it, or
+        CircuitOpenError if YouTube is currently considered down."""
+
+        if self.quota:
+            self.quota.check(endpoint)
+
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"YouTube {endpoint} request not attempted: circuit open")
+
+        start = time.monotonic()
+
+        try:
+            res_json = self._get_with_retries(endpoint, params)
+        except YouTubeAPIError as e:
+            if e.status in self.CLIENT_ERROR_STATUSES:
+                self.breaker.record_success(time.monotonic() - start)
+            else:
+                self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success(time.monotonic() - start)
+
+        return res_json
+
+    def _get_with_retries(self, endpoint, params):
+        """Call `endpoint`, retrying transient errors."""
+
+        url = f"{self.base_url}/{endpoint}"
+        params["key"] = self.api_key
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+                time.sleep(self._backoff_delay(attempt))
+
+            self._count("calls")
+
+            # YouTube charges for every request, including failed ones
+            if self.quota:
+                self.quota.charge(endpoint)
+
+            try:
+                res = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # the exception text includes the url (and so the api key)
+                error = YouTubeAPIError(f"YouTube {endpoint} request failed: {type(e).__name__}")
+                continue
+
+            if res.ok:
+                try:
+                    return orjson.loads(res.content)
+                except orjson.JSONDecodeError:
+                    error = YouTubeAPIError(f"YouTube {endpoint} request returned invalid JSON")
+                    continue
+
+            error = YouTubeAPIError(f"YouTube {endpoint} request returned {res.status_code}",
+                                    status=res.status_code,
+                                    reason=error_reason(res))
+
+            if res.status_code not in self.RETRY_STATUSES:
+                break
+
+        self._count("failures")
+        raise error
+
+    def search(self, keyword, max_results, **params):
+        """Search for videos matching `keyword`."""
+
+        return self.get("search",
+                        part="snippet",
+                        maxResults=max_results,
+                        type="video",
+                        q=keyword,
+                        order="relevance",
+                        **params)
+
+    def videos(self, yt_video_ids, part="player", **params):
+        """Get details for the video(s) with the given id(s).
+        `yt_video_ids` is one id or a list of up to MAX_IDS_PER_CALL ids."""
+
+        if not isinstance(yt_video_ids, str):
+            if len(yt_video_ids) > self.MAX_IDS_PER_CALL:
+                raise ValueError(f"at most {self.MAX_IDS_PER_CALL} video ids may be requested at once")
+            yt_video_ids = ",".join(yt_video_ids)
+
+        return self.get("videos", part=part, id=yt_video_ids, **params)
+
+    def stats(self):
+        """Return the call counters as a dict."""
+
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "breaker": self.breaker.stats(),
+            "quota": self.quota.stats() if self.quota else None,
+        }
+
+    def _backoff_delay(self, attempt):
+        """Full-jitter exponential backoff for retry number `attempt`."""
+
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+def error_reason(res):
+    """Pull the error reason (e.g. "quotaExceeded") out of an error response."""
+
+    try:
+        return res.json()["error"]["errors"][0]["reason"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+ISO_DURATION = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+
+def parse_duration(duration):
+    """Convert an ISO 8601 duration from YouTube (e.g. "PT1H2M3S") to seconds.
+    Return None if it cannot be parsed."""
+
+    match = ISO_DURATION.match(duration or "")
+
+    if not match:
+        return None
+
+    days, hours, minutes, seconds = (int(n or 0) for n in match.groups())
+
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
@@ -0,0 +1,401 @@
+"""Local stand-in for the YouTube Data API.
+
+Serves the search, videos and playlistItems endpoints so the app can be
+load tested offline without spending quota. Responses are replayed from
+recorded fixtures when there is one for the request, and otherwise built
+from the sample videos in generator/videos.csv. Latency, server errors
+and quota errors can be injected.
+
+run it like:
+
+    python youtube_stub.py                      # serves on port 5001
+
+and point the app at it:
+
+    API_BASE_URL=http://localhost:5001/youtube/v3 flask run
+
+record a fixture from the real API (needs API_SECRET_KEY):
+
+    python youtube_stub.py record search "css for beginners"
+    python youtube_stub.py record videos yfoY53QXEnI
+
+Injected faults are set with environment variables, or changed while the
+stub is running by POSTing JSON with the same keys (lower case, without
+the STUB_ prefix) to /_stub/config:
+
+    STUB_LATENCY_MS         latency added to every response (default 0)
+    STUB_LATENCY_JITTER_MS  random extra latency, up to this much (default 0)
+    STUB_ERROR_RATE         fraction of requests that get a 503 (default 0)
+    STUB_QUOTA_ERROR_RATE   fraction of requests that get a 403 quotaExceeded (default 0)
+    STUB_FIXTURES_DIR       where recorded fixtures live (default fixtures/youtube)
+
+The `fields` and `part` parameters are accepted but not applied; responses
+always carry the full snippet.
+"""
+
+import base64
+import csv
+import json
+import os
+import random
+import re
+import sys
+import time
+
+from flask import Flask, request, jsonify
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_VIDEOS_CSV = os.path.join(HERE, "generator", "videos.csv")
+REAL_API_BASE_URL = "https://www.googleapis.com/youtube/v3"
+
+# how many results a synthesized search pretends to have
+TOTAL_RESULTS = 200
+
+app = Flask(__name__)
+
+app.config['STUB'] = {
+    "latency_ms": float(os.environ.get('STUB_LATENCY_MS', 0)),
+    "latency_jitter_ms": float(os.environ.get('STUB_LATENCY_JITTER_MS', 0)),
+    "error_rate": float(os.environ.get('STUB_ERROR_RATE', 0)),
+    "quota_error_rate": float(os.environ.get('STUB_QUOTA_ERROR_RATE', 0)),
+    "fixtures_dir": os.environ.get('STUB_FIXTURES_DIR', os.path.join(HERE, "fixtures", "youtube")),
+}
+
+# counts of requests served, by endpoint
+app.config['STUB_REQUESTS'] = {}
+
+
+def load_sample_videos():
+    """Read the sample videos used to build responses."""
+
+    with open(SAMPLE_VIDEOS_CSV) as videos:
+        return list(csv.DictReader(videos))
+
+
+SAMPLE_VIDEOS = load_sample_videos()
+
+
+@app.before_request
+def inject_faults():
+    """Delay the response and/or fail it, as configured."""
+
+    if request.path.startswith("/_stub"):
+        return None
+
+    endpoint = request.path.rsplit("/", 1)[-1]
+    counts = app.config['STUB_REQUESTS']
+    counts[endpoint] = counts.get(endpoint, 0) + 1
+
+    settings = app.config['STUB']
+    delay_ms = settings["latency_ms"] + random.uniform(0, settings["latency_jitter_ms"])
+    if delay_ms:
+        time.sleep(delay_ms / 1000)
+
+    if random.random() < settings["quota_error_rate"]:
+        return api_error(403, "quotaExceeded",
+                         "The request cannot be completed because you have exceeded your quota.")
+
+    if random.random() < settings["error_rate"]:
+        return api_error(503, "backendError", "Backend Error")
+
+    return None
+
+
+# *******************************
+# YOUTUBE DATA API ROUTES
+# *******************************
+
+@app.route("/youtube/v3/search")
+def search():
+    """Search results for `q`, `maxResults` at a time."""
+
+    q = request.args.get("q", "")
+    page_token = request.args.get("pageToken", "")
+
+    fixture = load_fixture("search", f"{slugify(q)}{'-' + page_token if page_token else ''}")
+    if fixture is not None:
+        return jsonify(fixture)
+
+    max_results = min(int(request.args.get("maxResults", 5)), 50)
+    offset = decode_page_token(page_token)
+
+    videos = [sample_video(i) for i in ranked_sample_indexes(q, offset, max_results)]
+
+    res = {
+        "kind": "youtube#searchListResponse",
+        "etag": etag(q, offset),
+        "regionCode": "US",
+        "pageInfo": {"totalResults": TOTAL_RESULTS, "resultsPerPage": max_results},
+        "items": [search_item(video) for video in videos],
+    }
+
+    if offset + max_results < TOTAL_RESULTS:
+        res["nextPageToken"] = encode_page_token(offset + max_results)
+    if offset:
+        res["prevPageToken"] = encode_page_token(max(offset - max_results, 0))
+
+    return jsonify(res)
+
+
+@app.route("/youtube/v3/videos")
+def videos():
+    """Details for up to 50 comma-separated video `id`s."""
+
+    ids = [yt_id for yt_id in request.args.get("id", "").split(",") if yt_id][:50]
+
+    items = []
+    for yt_id in ids:
+        fixture = load_fixture("videos", yt_id)
+        if fixture is not None:
+            items.extend(fixture.get("items", []))
+        else:
+            items.append(video_item(yt_id))
+
+    return jsonify({
+        "kind": "youtube#videoListResponse",
+        "etag": etag(*ids),
+        "pageInfo": {"totalResults": len(items), "resultsPerPage": len(items)},
+        "items": items,
+    })
+
+
+@app.route("/youtube/v3/playlistItems")
+def playlist_items():
+    """Videos in the playlist `playlistId`, `maxResults` at a time."""
+
+    playlist_id = request.args.get("playlistId", "")
+    page_token = request.args.get("pageToken", "")
+
+    fixture = load_fixture("playlistItems", f"{slugify(playlist_id)}{'-' + page_token if page_token else ''}")
+    if fixture is not None:
+        return jsonify(fixture)
+
+    max_results = min(int(request.args.get("maxResults", 5)), 50)
+    offset = decode_page_token(page_token)
+    total = len(SAMPLE_VIDEOS)
+
+    items = [playlist_item(playlist_id, position, sample_video(position))
+             for position in range(offset, min(offset + max_results, total))]
+
+    res = {
+        "kind": "youtube#playlistItemListResponse",
+        "etag": etag(playlist_id, offset),
+        "pageInfo": {"totalResults": total, "resultsPerPage": max_results},
+        "items": items,
+    }
+
+    if offset + max_results < total:
+        res["nextPageToken"] = encode_page_token(offset + max_results)
+
+    return jsonify(res)
+
+
+# *******************************
+# STUB CONTROL ROUTES
+# *******************************
+
+@app.route("/_stub/config", methods=["GET", "POST"])
+def stub_config():
+    """Show or change the injected faults."""
+
+    if request.method == "POST":
+        settings = app.config['STUB']
+        for key, value in request.json.items():
+            if key in settings:
+                settings[key] = value if key == "fixtures_dir" else float(value)
+
+    return jsonify(app.config['STUB'])
+
+
+@app.route("/_stub/stats")
+def stub_stats():
+    """Show how many requests each endpoint has served."""
+
+    return jsonify(app.config['STUB_REQUESTS'])
+
+
+## *********************************
+## HELPER FUNCTIONS
+## *********************************
+
+def api_error(status, reason, message):
+    """Make an error response shaped like YouTube's."""
+
+    body = {"error": {"code": status,
+                      "message": message,
+                      "errors": [{"message": message, "domain": "youtube.quota", "reason": reason}]}}
+    return jsonify(body), status
+
+
+def load_fixture(endpoint, name):
+    """Return the recorded response for a request, or None if there isn't one."""
+
+    path = os.path.join(app.config['STUB']["fixtures_dir"], endpoint, f"{name}.json")
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as fixture:
+        return json.load(fixture)
+
+
+def slugify(text):
+    """Turn a keyword into a fixture file name."""
+
+    return re.sub(r"[^a-z0-9]+", "-", " ".join(text.split()).casefold()).strip("-") or "_"
+
+
+def encode_page_token(offset):
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode()).decode().rstrip("=")
+
+
+def decode_page_token(page_token):
+    if not page_token:
+        return 0
+
+    try:
+        padded = page_token + "=" * (-len(page_token) % 4)
+        return int(base64.urlsafe_b64decode(padded).decode().split(":")[1])
+    except (ValueError, IndexError):
+        return 0
+
+
+def etag(*parts):
+    return base64.urlsafe_b64encode(repr(parts).encode()).decode()[:27]
+
+
+def ranked_sample_indexes(q, offset, count):
+    """Indexes of the results for `q`, from `offset`.
+
+    Sample videos matching more words of `q` come first; after them the
+    samples repeat (as numbered copies) so every search has TOTAL_RESULTS."""
+
+    words = set(q.casefold().split())
+
+    def score(i):
+        text = f"{SAMPLE_VIDEOS[i]['title']} {SAMPLE_VIDEOS[i]['description']}".casefold()
+        return sum(1 for word in words if word in text)
+
+    ranked = sorted(range(len(SAMPLE_VIDEOS)), key=lambda i: -score(i))
+
+    end = min(offset + count, TOTAL_RESULTS)
+    return [ranked[i % len(ranked)] + len(ranked) * (i // len(ranked))
+            for i in range(offset, end)]
+
+
+def sample_video(n):
+    """The n-th sample video; past the end of the samples, numbered copies."""
+
+    video = SAMPLE_VIDEOS[n % len(SAMPLE_VIDEOS)]
+    copy = n // len(SAMPLE_VIDEOS)
+
+    if not copy:
+        return video
+
+    return dict(video,
+                title=f"{video['title']} (part {copy + 1})",
+                yt_video_id=f"{video['yt_video_id'][:8]}{copy:03d}")
+
+
+def snippet(video):
+    yt_id = video["yt_video_id"]
+    return {
+        "publishedAt": "2020-11-04T16:00:12Z",
+        "channelId": video["yt_channel_id"],
+        "title": video["title"],
+        "description": video["description"].strip('"'),
+        "thumbnails": {
+            "default": {"url": f"https://i.ytimg.com/vi/{yt_id}/default.jpg", "width": 120, "height": 90},
+            "medium": {"url": f"https://i.ytimg.com/vi/{yt_id}/mqdefault.jpg", "width": 320, "height": 180},
+            "high": {"url": f"https://i.ytimg.com/vi/{yt_id}/hqdefault.jpg", "width": 480, "height": 360},
+        },
+        "channelTitle": video["yt_channel_title"],
+        "liveBroadcastContent": "none",
+    }
+
+
+def search_item(video):
+    return {
+        "kind": "youtube#searchResult",
+        "etag": etag(video["yt_video_id"]),
+        "id": {"kind": "youtube#video", "videoId": video["yt_video_id"]},
+        "snippet": dict(snippet(video), publishTime="2020-11-04T16:00:12Z"),
+    }
+
+
+def video_item(yt_id):
+    """Details for a video; unknown ids get made-up details."""
+
+    video = next((v for v in SAMPLE_VIDEOS if v["yt_video_id"] == yt_id), None)
+    if video is None:
+        video = dict(SAMPLE_VIDEOS[sum(map(ord, yt_id)) % len(SAMPLE_VIDEOS)], yt_video_id=yt_id)
+
+    seconds = 60 + sum(map(ord, yt_id)) * 7 % 3600
+
+    return {
+        "kind": "youtube#video",
+        "etag": etag(yt_id),
+        "id": yt_id,
+        "snippet": snippet(video),
+        "contentDetails": {"duration": f"PT{seconds // 60}M{seconds % 60}S",
+                           "dimension": "2d",
+                           "definition": "hd",
+                           "caption": "false"},
+        "statistics": {"viewCount": str(seconds * 1013),
+                       "likeCount": str(seconds * 11),
+                       "commentCount": str(seconds // 7)},
+        "player": {"embedHtml": f'<iframe width="480" height="270" src="//www.youtube.com/embed/{yt_id}" '
+                                f'frameborder="0" allow="accelerometer; autoplay; clipboard-write; '
+                                f'encrypted-media; gyroscope; picture-in-picture" allowfullscreen></iframe>'},
+    }
+
+
+def playlist_item(playlist_id, position, video):
+    return {
+        "kind": "youtube#playlistItem",
+        "etag": etag(playlist_id, position),
+        "id": f"{playlist_id}.{position}",
+        "snippet": dict(snippet(video),
+                        playlistId=playlist_id,
+                        position=position,
+                        resourceId={"kind": "youtube#video", "videoId": video["yt_video_id"]}),
+    }
+
+
+def record(endpoint, value):
+    """Fetch a response from the real YouTube Data API and save it as a fixture."""
+
+    import requests
+
+    params = {"key": os.environ['API_SECRET_KEY']}
+
+    if endpoint == "search":
+        params.update(part="snippet", type="video", maxResults=20, order="relevance", q=value)
+        name = slugify(value)
+    elif endpoint == "videos":
+        params.update(part="snippet,player,contentDetails,statistics", id=value)
+        name = value
+    elif endpoint == "playlistItems":
+        params.update(part="snippet", maxResults=20, playlistId=value)
+        name = slugify(value)
+    else:
+        raise SystemExit(f"Unknown endpoint: {endpoint}")
+
+    res = requests.get(f"{REAL_API_BASE_URL}/{endpoint}", params=params, timeout=10)
+    res.raise_for_status()
+
+    path = os.path.join(app.config['STUB']["fixtures_dir"], endpoint, f"{name}.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fixture:
+        json.dump(res.json(), fixture, indent=2)
+
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "record":
+        record(sys.argv[2], sys.argv[3])
+    else:
+        port = int(os.environ.get('STUB_PORT', 5001))
+        # threaded, so concurrent requests during a load test overlap
+        app.run(port=port, threaded=True)